@@ -816,7 +816,7 @@ class age_results(Analyzer):
                 if 'prevalence' in rkey:
                     if 'hpv' in rkey:  # Denominator is whole population
                         if rdict.by_hiv:
-                            inds = sc.findinds(ppl[rdict.hiv_attr])
+                            inds = np.flatnonzero(ppl[rdict.hiv_attr])
                             denom = bin_ages(inds=inds, bins=bins)
                         else:
                             denom = bin_ages(inds=ppl.alive, bins=bins)
@@ -827,13 +827,13 @@ class age_results(Analyzer):
 
                 if 'incidence' in rkey:
                     if 'hpv' in rkey:  # Denominator is susceptible population
-                        inds = sc.findinds(ppl.is_female_alive & ~ppl.cancerous.any(axis=0))
+                        inds = np.flatnonzero(ppl.is_female_alive & ~ppl.cancerous.any(axis=0))
                         denom = bin_ages(inds=hpu.true(ppl.sus_pool), bins=bins)
                     else:  # Denominator is females at risk for cancer
                         if rdict.by_hiv:
-                            inds = sc.findinds(ppl.is_female_alive & ppl[rdict.hiv_attr] * ~ppl.cancerous.any(axis=0))
+                            inds = np.flatnonzero(ppl.is_female_alive & ppl[rdict.hiv_attr] & ~ppl.cancerous.any(axis=0))
                         else:
-                            inds = sc.findinds(ppl.is_female_alive & ~ppl.cancerous.any(axis=0))
+                            inds = np.flatnonzero(ppl.is_female_alive & ~ppl.cancerous.any(axis=0))
                         denom = bin_ages(inds, bins) / 1e5  # CIN and cancer are per 100,000 women
                     # if 'total' not in result and 'cancer' not in result: denom = denom[None, :] # THIS IS IT!!!!
                     self.results[rkey][date] = self.results[rkey][date] / denom
@@ -409,7 +409,14 @@ class BaseSim(ParsObj):
         If which is 'total', return only the main results keys. If 'genotype', return
         only genotype keys. If 'all', return all keys.
 
+        The keys are cached after the first call (and the cache is reset by
+        init_results()), since e.g. compute_summary() and plotting call this
+        repeatedly and the scan over the results is slow.
         '''
+        cache = getattr(self, '_result_keys', None)
+        if cache is not None and which in cache:
+            return list(cache[which]) # Return a copy so callers can't modify the cache
+
         keys = []
         subchoices = ['total', 'genotype', 'sex', 'age', 'type_dist']
         if which in ['total']:
@@ -429,6 +436,10 @@ class BaseSim(ParsObj):
         else:
             errormsg = f'Choice "{which}" not available; choices are: {sc.strjoin(subchoices+["all"])}'
             raise ValueError(errormsg)
+
+        if cache is not None:
+            cache[which] = tuple(keys)
+
         return keys
 
 
@@ -261,6 +261,10 @@ class PeopleMeta(sc.prettyobj):
 
 #%% Default result settings
 
+# Cache a default instance, since constructing all the states is relatively slow and
+# sim.init_results() (which can be called many times in sweeps) does not modify them
+default_meta = PeopleMeta()
+
 # Flows
 # All are stored (1) by genotype and (2) as the total across genotypes
 class Flow():
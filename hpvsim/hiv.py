@@ -297,7 +297,7 @@ class HIVsim(hpb.ParsObj):
         hiv_inds = sc.autolist()
 
         for sn, cd4state in enumerate(self.cd4states):
-            inds = sc.findinds((people.cd4 >= self.cd4_lb[sn]) & (people.cd4 < self.cd4_ub[sn]))
+            inds = np.flatnonzero((people.cd4 >= self.cd4_lb[sn]) & (people.cd4 < self.cd4_ub[sn]))
             hiv_inds += list(inds)
             if len(inds):
                 for ir, rel_par in enumerate(['rel_sus', 'rel_sev', 'rel_imm']):
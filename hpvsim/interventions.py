@@ -14,12 +14,19 @@ from . import utils as hpu
 from . import immunity as hpi
 from . import base as hpb
 from collections import defaultdict
+from functools import lru_cache
 
 #%% Define data files
 datafiles = sc.objdict()
 for key in ['dx', 'tx', 'vx', 'txvx']:
     datafiles[key] = hpd.datadir / f'products_{key}.csv'
 
+@lru_cache(maxsize=None)
+def _read_products(key):
+    ''' Read (and cache) one of the product parameter files; these are static, and
+    otherwise get re-parsed every time a product is constructed by name '''
+    return pd.read_csv(datafiles[key])
+
 
 #%% Helper functions
 
@@ -810,11 +817,11 @@ class BaseScreening(BaseTest):
         the screening interval.
         '''
         adult_females   = sim.people.is_female_adult
-        in_age_range    = (sim.people.age >= self.age_range[0]) * (sim.people.age <= self.age_range[1])
-        conditions      = (adult_females * in_age_range).astype(bool)
+        in_age_range    = (sim.people.age >= self.age_range[0]) & (sim.people.age <= self.age_range[1])
+        conditions      = adult_females & in_age_range
         if self.eligibility is not None:
             other_eligible  = sc.promotetoarray(self.eligibility(sim))
-            conditions      = conditions * other_eligible
+            conditions      = conditions & other_eligible
         return hpu.true(conditions)
 
     def apply(self, sim):
@@ -995,10 +1002,10 @@ class BaseTreatment(Intervention):
         Check people's eligibility for treatment
         '''
         females         = sim.people.is_female
-        in_age_range    = (sim.people.age >= self.age_range[0]) * (sim.people.age <= self.age_range[1])
+        in_age_range    = (sim.people.age >= self.age_range[0]) & (sim.people.age <= self.age_range[1])
         alive           = sim.people.alive
         nocancer        = ~sim.people.cancerous.any(axis=0)
-        conditions      = (females * in_age_range * alive * nocancer)
+        conditions      = (females & in_age_range & alive & nocancer)
         return conditions
 
     def get_accept_inds(self, sim):
@@ -1465,7 +1472,7 @@ def default_dx(prod_name=None):
     '''
     Create default diagnostic products
     '''
-    dfdx = pd.read_csv(datafiles.dx) # Read in dataframe with parameters
+    dfdx = _read_products('dx') # Read in dataframe with parameters
     dxprods = dict(
         # Default primary screening diagnostics
         via             = dx(dfdx[dfdx.name == 'via'],              hierarchy=['positive', 'inadequate', 'negative']),
@@ -1487,8 +1494,8 @@ def default_tx(prod_name=None):
     '''
     Create default treatment products
     '''
-    dftx = pd.read_csv(datafiles.tx) # Read in dataframe with parameters
-    dftxvx = pd.read_csv(datafiles.txvx)
+    dftx = _read_products('tx') # Read in dataframe with parameters
+    dftxvx = _read_products('txvx')
     txprods = dict()
     for name in dftx.name.unique():
         if name =='txvx1':
@@ -1509,7 +1516,7 @@ def default_vx(prod_name=None):
     '''
     Create default vaccine products
     '''
-    dfvx = pd.read_csv(datafiles.vx) # Read in dataframe with parameters
+    dfvx = _read_products('vx') # Read in dataframe with parameters
     vxprods = dict()
     for name in dfvx.name.unique():
         vxprods[name]       = vx(genotype_pars=dfvx[dfvx.name==name], imm_init=dict(dist='beta', par1=30, par2=2))
@@ -82,14 +82,14 @@ class Sim(hpb.BaseSim):
         self.validate_pars()  # Ensure parameters have valid values
         self.validate_dt()
         self.init_time_vecs()  # Initialise time vectors
-        hpu.set_seed(self['rand_seed']) # Reset the random seed before the population is created
+        self.rng = hpu.set_seed(self['rand_seed']) # Reset the random seed before the population is created
         self.init_genotypes() # Initialize the genotypes
         self.init_results() # After initializing the genotypes and people, create the results structure
         self.init_interventions()  # Initialize the interventions BEFORE the people, because then vaccination interventions get counted in immunity structures
         self.init_immunity() # Includes immunity matrices and cumulative dysplasia arrays
         self.init_people(reset=reset, init_states=init_states, **kwargs) # Create all the people (the heaviest step)
         if init_analyzers: self.init_analyzers()  # ...and the analyzers...
-        hpu.set_seed(self['rand_seed']+1)  # Reset the random seed to the default run seed, so that if the simulation is run with reset_seed=False right after initialization, it will still produce the same output
+        self.rng = hpu.set_seed(self['rand_seed']+1)  # Reset the random seed to the default run seed, so that if the simulation is run with reset_seed=False right after initialization, it will still produce the same output
         self.initialized   = True
         self.complete      = False
         self.results_ready = False
@@ -443,7 +443,7 @@ class Sim(hpb.BaseSim):
             results[flow.name+'_by_age']        = init_res(flow.label+' by age', n_rows=na, color=flow.color)
 
         # Create stocks
-        for stock in hpd.PeopleMeta().stock_states:
+        for stock in hpd.default_meta.stock_states:
             results[f'n_{stock.name}']              = init_res(stock.label, color=stock.color)
             results[f'n_{stock.name}_by_genotype']  = init_res(stock.label+' by genotype', n_rows=ng)
 
@@ -472,7 +472,7 @@ class Sim(hpb.BaseSim):
         results['asr_cancer_incidence'] = init_res('Age-adjusted cervical cancer incidence', scale=False)
         results['asr_cancer_mortality'] = init_res('Age-adjusted cervical cancer mortality', scale=False)
 
-        stock_colors = [i for i in set(hpd.PeopleMeta().stock_colors) if i is not None]
+        stock_colors = [i for i in set(hpd.default_meta.stock_colors) if i is not None]
 
         # Type distributions by cytology
         for var, name in zip(hpd.type_dist_keys, hpd.type_dist_names):
@@ -537,6 +537,7 @@ class Sim(hpb.BaseSim):
         # Final items
         self.results = results
         self.results_ready = False
+        self._result_keys = dict() # Reset the result_keys() cache since the results have changed
 
         return
 
@@ -967,7 +968,7 @@ class Sim(hpb.BaseSim):
             # The seed is offset by 1 to avoid drawing the same random numbers as those used for population generation, otherwise
             # the first set of random numbers in the model (e.g., deaths) will be correlated with the first set of random numbers
             # drawn in population generation (e.g., sex)
-            hpu.set_seed(self['rand_seed']+1)
+            self.rng = hpu.set_seed(self['rand_seed']+1)
 
         # Check for AlreadyRun errors
         errormsg = None
@@ -229,7 +229,7 @@ def logn_percentiles_to_pars(x1, p1, x2, p2):
 __all__ += ['sample', 'get_pdf', 'set_seed']
 
 
-def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
+def sample(dist=None, par1=None, par2=None, size=None, rng=None, **kwargs):
     '''
     Draw a sample from the distribution specified by the input. The available
     distributions are:
@@ -250,6 +250,7 @@ def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
         par1 (float): the "main" distribution parameter (e.g. mean)
         par2 (float): the "secondary" distribution parameter (e.g. std)
         size (int):   the number of samples (default=1)
+        rng (np.random.Generator): if supplied, draw from this explicit generator (e.g. sim.rng) instead of the global NumPy random state
         kwargs (dict): passed to individual sampling functions
 
     Returns:
@@ -294,23 +295,27 @@ def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
     if size is not None and not isinstance(size, tuple):
         size = int(size)
 
+    # Default to the global state, which is what set_seed() controls
+    if rng is None:
+        rng = np.random
+
     # Compute distribution parameters and draw samples
     # NB, if adding a new distribution, also add to choices above
-    if   dist in ['unif', 'uniform']: samples = np.random.uniform(low=par1, high=par2, size=size, **kwargs)
-    elif dist in ['norm', 'normal']:  samples = np.random.normal(loc=par1, scale=par2, size=size, **kwargs)
-    elif dist == 'normal_pos':        samples = np.abs(np.random.normal(loc=par1, scale=par2, size=size, **kwargs))
-    elif dist == 'normal_int':        samples = np.round(np.abs(np.random.normal(loc=par1, scale=par2, size=size, **kwargs)))
-    elif dist == 'poisson':           samples = n_poisson(rate=par1, n=size, **kwargs) # Use Numba version below for speed
-    elif dist == 'poisson1':          samples = n_poisson(rate=par1, n=size, **kwargs)+1 # Add 1
-    elif dist == 'neg_binomial':      samples = n_neg_binomial(rate=par1, dispersion=par2, n=size, **kwargs) # Use custom version below
-    elif dist == 'neg_binomial1':      samples = n_neg_binomial(rate=par1, dispersion=par2, n=size, **kwargs) +1 # Add 1
-    elif dist == 'beta':              samples = np.random.beta(a=par1, b=par2, size=size, **kwargs)
-    elif dist == 'gamma':             samples = np.random.gamma(shape=par1, scale=par2, size=size, **kwargs)
+    if   dist in ['unif', 'uniform']: samples = rng.uniform(low=par1, high=par2, size=size, **kwargs)
+    elif dist in ['norm', 'normal']:  samples = rng.normal(loc=par1, scale=par2, size=size, **kwargs)
+    elif dist == 'normal_pos':        samples = np.abs(rng.normal(loc=par1, scale=par2, size=size, **kwargs))
+    elif dist == 'normal_int':        samples = np.round(np.abs(rng.normal(loc=par1, scale=par2, size=size, **kwargs)))
+    elif dist == 'poisson':           samples = n_poisson(rate=par1, n=size, rng=rng, **kwargs) # Use Numba version below for speed
+    elif dist == 'poisson1':          samples = n_poisson(rate=par1, n=size, rng=rng, **kwargs)+1 # Add 1
+    elif dist == 'neg_binomial':      samples = n_neg_binomial(rate=par1, dispersion=par2, n=size, rng=rng, **kwargs) # Use custom version below
+    elif dist == 'neg_binomial1':      samples = n_neg_binomial(rate=par1, dispersion=par2, n=size, rng=rng, **kwargs) +1 # Add 1
+    elif dist == 'beta':              samples = rng.beta(a=par1, b=par2, size=size, **kwargs)
+    elif dist == 'gamma':             samples = rng.gamma(shape=par1, scale=par2, size=size, **kwargs)
     elif dist in ['lognorm', 'lognormal', 'lognorm_int', 'lognormal_int']:
         if (sc.isnumber(par1) and par1>0) or (sc.checktype(par1,'arraylike') and (par1>0).all()):
             mean  = np.log(par1**2 / np.sqrt(par2**2 + par1**2)) # Computes the mean of the underlying normal distribution
             sigma = np.sqrt(np.log(par2**2/par1**2 + 1)) # Computes sigma for the underlying normal distribution
-            samples = np.random.lognormal(mean=mean, sigma=sigma, size=size, **kwargs)
+            samples = rng.lognormal(mean=mean, sigma=sigma, size=size, **kwargs)
         else:
             samples = np.zeros(size)
         if '_int' in dist:
@@ -318,7 +323,7 @@ def sample(dist=None, par1=None, par2=None, size=None, **kwargs):
     elif dist == 'beta_mean': # Calculate a and b using mean (par1) and variance (par2) https://stats.stackexchange.com/questions/12232/calculating-the-parameters-of-a-beta-distribution-using-the-mean-and-variance
         a       = ((1 - par1)/par2 - 1/par1) * par1**2
         b       = a * (1 / par1 - 1)
-        samples = np.random.beta(a=a, b=b, size=size, **kwargs)
+        samples = rng.beta(a=a, b=b, size=size, **kwargs)
     else:
         errormsg = f'The selected distribution "{dist}" is not implemented; choices are: {sc.newlinejoin(choices)}'
         raise NotImplementedError(errormsg)
@@ -363,14 +368,24 @@ def set_seed(seed=None):
     Reset the random seed. This function also resets Python's built-in random
     number generated.
 
+    In addition to reseeding the global NumPy state (which all the samplers in
+    this module use by default, for reproducibility with stored baselines), this
+    returns an explicit np.random.Generator seeded with the same value. The sim
+    stores this as sim.rng, and it can be passed to the samplers here via their
+    rng argument for code that needs its own reproducible stream (e.g. to avoid
+    contention on the global state).
+
     Args:
         seed (int): the random seed
+
+    Returns:
+        A np.random.Generator seeded with the same seed
     '''
     # Dies if a float is given
     if seed is not None:
         seed = int(seed)
     np.random.seed(seed) # If None, reinitializes it
-    return
+    return np.random.default_rng(seed)
 
 
 #%% Probabilities -- mostly not jitted since performance gain is minimal
@@ -378,13 +393,14 @@ def set_seed(seed=None):
 __all__ += ['n_binomial', 'binomial_filter', 'binomial_arr', 'n_multinomial',
             'poisson', 'n_poisson', 'n_neg_binomial', 'choose', 'choose_r', 'choose_w', 'participation_filter']
 
-def n_binomial(prob, n):
+def n_binomial(prob, n, rng=None):
     '''
     Perform multiple binomial (Bernolli) trials
 
     Args:
         prob (float): probability of each trial succeeding
         n (int): number of trials (size of array)
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     Returns:
         Boolean array of which trials succeeded
@@ -393,10 +409,11 @@ def n_binomial(prob, n):
 
         outcomes = hpv.n_binomial(0.5, 100) # Perform 100 coin-flips
     '''
-    return np.random.random(n) < prob
+    if rng is None: rng = np.random
+    return rng.random(n) < prob
 
 
-def binomial_filter(prob, arr):
+def binomial_filter(prob, arr, rng=None):
     '''
     Binomial "filter" -- the same as n_binomial, except return
     the elements of arr that succeeded.
@@ -404,6 +421,7 @@ def binomial_filter(prob, arr):
     Args:
         prob (float): probability of each trial succeeding
         arr (array): the array to be filtered
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     Returns:
         Subset of array for which trials succeeded
@@ -412,15 +430,17 @@ def binomial_filter(prob, arr):
 
         inds = hpv.binomial_filter(0.5, np.arange(20)**2) # Return which values out of the (arbitrary) array passed the coin flip
     '''
-    return arr[(np.random.random(len(arr)) < prob).nonzero()[0]]
+    if rng is None: rng = np.random
+    return arr[(rng.random(len(arr)) < prob).nonzero()[0]]
 
 
-def binomial_arr(prob_arr):
+def binomial_arr(prob_arr, rng=None):
     '''
     Binomial (Bernoulli) trials each with different probabilities.
 
     Args:
         prob_arr (array): array of probabilities
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     Returns:
          Boolean array of which trials on the input array succeeded
@@ -429,16 +449,18 @@ def binomial_arr(prob_arr):
 
         outcomes = hpv.binomial_arr([0.1, 0.1, 0.2, 0.2, 0.8, 0.8]) # Perform 6 trials with different probabilities
     '''
-    return np.random.random(prob_arr.shape) < prob_arr
+    if rng is None: rng = np.random
+    return rng.random(prob_arr.shape) < prob_arr
 
 
-def n_multinomial(probs, n): # No speed gain from Numba
+def n_multinomial(probs, n, rng=None): # No speed gain from Numba
     '''
     An array of multinomial trials.
 
     Args:
         probs (array): probability of each outcome, which usually should sum to 1
         n (int): number of trials
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     Returns:
         Array of integer outcomes
@@ -447,39 +469,44 @@ def n_multinomial(probs, n): # No speed gain from Numba
 
         outcomes = hpv.n_multinomial(np.ones(6)/6.0, 50)+1 # Return 50 die-rolls
     '''
-    return np.searchsorted(np.cumsum(probs), np.random.random(n))
+    if rng is None: rng = np.random
+    return np.searchsorted(np.cumsum(probs), rng.random(n))
 
 
-def poisson(rate):
+def poisson(rate, rng=None):
     '''
     A Poisson trial.
 
     Args:
         rate (float): the rate of the Poisson process
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         outcome = hpv.poisson(100) # Single Poisson trial with mean 100
     '''
-    return np.random.poisson(rate, 1)[0]
+    if rng is None: rng = np.random
+    return rng.poisson(rate, 1)[0]
 
 
-def n_poisson(rate, n):
+def n_poisson(rate, n, rng=None):
     '''
     An array of Poisson trials.
 
     Args:
         rate (float): the rate of the Poisson process (mean)
         n (int): number of trials
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         outcomes = hpv.n_poisson(100, 20) # 20 Poisson trials with mean 100
     '''
-    return np.random.poisson(rate, n)
+    if rng is None: rng = np.random
+    return rng.poisson(rate, n)
 
 
-def n_neg_binomial(rate, dispersion, n, step=1): # Numba not used due to incompatible implementation
+def n_neg_binomial(rate, dispersion, n, step=1, rng=None): # Numba not used due to incompatible implementation
     '''
     An array of negative binomial trials. See hpv.sample() for more explanation.
 
@@ -488,49 +515,55 @@ def n_neg_binomial(rate, dispersion, n, step=1): # Numba not used due to incompa
         dispersion (float):  dispersion parameter; lower is more dispersion, i.e. 0 = infinite, ∞ = Poisson
         n (int): number of trials
         step (float): the step size to use if non-integer outputs are desired
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         outcomes = hpv.n_neg_binomial(100, 1, 50) # 50 negative binomial trials with mean 100 and dispersion roughly equal to mean (large-mean limit)
         outcomes = hpv.n_neg_binomial(1, 100, 20) # 20 negative binomial trials with mean 1 and dispersion still roughly equal to mean (approximately Poisson)
     '''
+    if rng is None: rng = np.random
     nbn_n = dispersion
     nbn_p = dispersion/(rate/step + dispersion)
-    samples = np.random.negative_binomial(n=nbn_n, p=nbn_p, size=n)*step
+    samples = rng.negative_binomial(n=nbn_n, p=nbn_p, size=n)*step
     return samples
 
 
-def choose(max_n, n):
+def choose(max_n, n, rng=None):
     '''
     Choose a subset of items (e.g., people) without replacement.
 
     Args:
         max_n (int): the total number of items
         n (int): the number of items to choose
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         choices = hpv.choose(5, 2) # choose 2 out of 5 people with equal probability (without repeats)
     '''
-    return np.random.choice(max_n, n, replace=False)
+    if rng is None: rng = np.random
+    return rng.choice(max_n, n, replace=False)
 
 
-def choose_r(max_n, n):
+def choose_r(max_n, n, rng=None):
     '''
     Choose a subset of items (e.g., people), with replacement.
 
     Args:
         max_n (int): the total number of items
         n (int): the number of items to choose
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         choices = hpv.choose_r(5, 10) # choose 10 out of 5 people with equal probability (with repeats)
     '''
-    return np.random.choice(max_n, n, replace=True)
+    if rng is None: rng = np.random
+    return rng.choice(max_n, n, replace=True)
 
 
-def choose_w(probs, n, unique=True): # No performance gain from Numba
+def choose_w(probs, n, unique=True, rng=None): # No performance gain from Numba
     '''
     Choose n items (e.g. people), each with a probability from the distribution probs.
 
@@ -538,11 +571,13 @@ def choose_w(probs, n, unique=True): # No performance gain from Numba
         probs (array): list of probabilities, should sum to 1
         n (int): number of samples to choose
         unique (bool): whether or not to ensure unique indices
+        rng (np.random.Generator): optional explicit generator (default: the global state)
 
     **Example**::
 
         choices = hpv.choose_w([0.2, 0.5, 0.1, 0.1, 0.1], 2) # choose 2 out of 5 people with nonequal probability.
     '''
+    if rng is None: rng = np.random
     probs = np.array(probs)
     n_choices = len(probs)
     n_samples = int(n)
@@ -551,7 +586,7 @@ def choose_w(probs, n, unique=True): # No performance gain from Numba
         probs = probs/probs_sum
     else: # Weights are all zero, choose uniformly
         probs = np.ones(n_choices)/n_choices
-    return np.random.choice(n_choices, n_samples, p=probs, replace=not(unique))
+    return rng.choice(n_choices, n_samples, p=probs, replace=not(unique))
 
 def participation_filter(inds, age, layer_probs, bins):
     '''
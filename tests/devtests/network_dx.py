@@ -3,12 +3,14 @@ Tests for network options (beyond-age assortativity and diagnostic visualization
 '''
 
 #%% Imports and settings
+import sys
+import matplotlib
+if not sys.stdout.isatty():
+    matplotlib.use('Agg') # Headless run: skip GUI backend init, just rasterize for savefig; set before anything imports pyplot
 import sciris as sc
 import numpy as np
 import hpvsim as hpv
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
 import scipy.linalg
 
 #%% Network analyzer
@@ -17,7 +19,8 @@ class new_pairs_snap(hpv.Analyzer):
     # analyzer for recording new partnerships of each timestep
     def __init__(self, start_year=None, year_mod=None, **kwargs):
         super().__init__(**kwargs)
-        self.new_pairs = pd.DataFrame()
+        self.new_pairs = None # Constructed in finalize(); seeding an empty DataFrame here would give every column object dtype
+        self._cols = None # Per-column array buffers, assembled into a DataFrame once in finalize()
         self.start_year = start_year
         self.year_mod = year_mod
         self.yearvec = None
@@ -36,15 +39,36 @@ class new_pairs_snap(hpv.Analyzer):
             year_since_start = sim.yearvec[sim.t] - sim['start']
             layer_keys = sim.people.layer_keys()
             for rtype in layer_keys:
-                new_rship_inds = (sim.people.contacts[rtype]['start'] == year_since_start).nonzero()[0]
+                layer = sim.people.contacts[rtype]
+                new_rship_inds = np.flatnonzero(layer['start'] == year_since_start)
                 if len(new_rship_inds):
-                    contacts = pd.DataFrame.from_dict(sim.people.contacts[rtype].get_inds(new_rship_inds))
-                    contacts['year'] = int(sim.yearvec[sim.t])
-                    contacts['rtype'] = rtype
-                    self.new_pairs = pd.concat([self.new_pairs, contacts])
+                    # Slice each column directly rather than going via get_inds(), which rebuilds
+                    # a whole Layer, and buffer the raw arrays -- constructing even a small
+                    # DataFrame per timestep costs dtype inference and index creation each call
+                    if self._cols is None:
+                        self._cols = {k: [] for k in [*layer.keys(), 'year', 'rtype']}
+                    for k in layer.keys():
+                        self._cols[k].append(layer[k][new_rship_inds])
+                    n_new = len(new_rship_inds)
+                    self._cols['year'].append(np.full(n_new, int(sim.yearvec[sim.t]), dtype=np.int32))
+                    self._cols['rtype'].append(np.full(n_new, rtype))
         return
 
-def network_demo():
+    def finalize(self, sim=None):
+        super().finalize()
+        if self._cols is not None:
+            self.new_pairs = pd.DataFrame({k: np.concatenate(v) for k,v in self._cols.items()}, copy=False)
+            self._cols = None
+        else:
+            self.new_pairs = pd.DataFrame() # No pairs were recorded
+        return
+
+def network_demo(do_rships=True):
+    '''
+    Compare the status-quo and clustered networks. If only the pair-mixing plots
+    are needed, pass do_rships=False to skip the people snapshots, which dominate
+    the analyzer memory and runtime.
+    '''
     clusters = [5, 5]
     mixing_mats = [np.ones((5,5)), scipy.linalg.circulant([1,0.5,0.1,0.1,0.5])]
     start = 1970
@@ -53,25 +77,30 @@ def network_demo():
     labels = ['status quo', 'clustered']
 
     sims = []
-    snap = hpv.snapshot(
-        timepoints=['1970', '1980', '1990', '2000', '2010', '2020'],
+    analyzers = [new_pairs_snap(start_year=start, year_mod=10)]
+    if do_rships: # The full people snapshots are only needed for plot_rships()
+        analyzers += [hpv.snapshot(timepoints=['1970', '1980', '1990', '2000', '2010', '2020'])]
+
+    # Construct the shared parameters once and deep-copy them per variant -- plain
+    # assignment would alias the dicts, so setting n_clusters for one variant would
+    # silently leak into the next, and the variants would share analyzer instances.
+    # NB, we can't go further and share one initialized sim across the variants,
+    # since the cluster assignments are baked into the population when it is created.
+    base_pars = dict(
+        n_agents=pop,
+        start=start,
+        end=end,
+        location='nigeria',
+        ms_agent_ratio=100,
+        analyzers=analyzers,
     )
-    new_pairs = new_pairs_snap(start_year=start, year_mod=10)
     for n_clusters, mixing, label in zip(clusters, mixing_mats, labels):
-        pars = dict(
-            n_agents=pop,
-            start=start,
-            end=end,
-            location='nigeria',
-            ms_agent_ratio=100,
-            n_clusters=n_clusters,
-            add_mixing=mixing,
-            analyzers=[snap, new_pairs]
-        )
+        pars = sc.dcp(base_pars)
+        pars.update(n_clusters=n_clusters, add_mixing=mixing)
         sim = hpv.Sim(pars=pars, label=label)
         sims.append(sim)
     msim = hpv.MultiSim(sims)
-    msim.run()
+    msim.run(parallel=True, n_cpus=min(len(sims), sc.cpu_count())) # Run the variants concurrently, one core each
     msim.plot()
 
     for sim in msim.sims:
@@ -79,9 +108,11 @@ def network_demo():
         plot_mixing(sim, 'age')
         plot_mixing(sim, 'cluster')
         # plot number of relationships over time
-        plot_rships(sim)
+        if do_rships:
+            plot_rships(sim)
 
 def plot_mixing(sim, dim):
+    import seaborn as sns # Import here since slow
     df_new_pairs = sim.get_analyzer('new_pairs_snap').new_pairs
     if dim == 'age':
         bins = np.linspace(0, 75, 16, dtype=int)
@@ -92,7 +123,11 @@ def plot_mixing(sim, dim):
         df_new_pairs['x_bins'] = df_new_pairs['cluster_f'].astype('category')
         df_new_pairs['y_bins'] = df_new_pairs['cluster_m'].astype('category')
 
-    count_df = df_new_pairs.groupby(['rtype', 'year', 'x_bins', 'y_bins']).size().reset_index(name='count')
+    # Categorical keys let pandas group on integer codes rather than hashing objects;
+    # observed=False keeps the full bin grid so the heatmaps stay square
+    for col in ['rtype', 'year']:
+        df_new_pairs[col] = df_new_pairs[col].astype('category')
+    count_df = df_new_pairs.groupby(['rtype', 'year', 'x_bins', 'y_bins'], observed=False).size().reset_index(name='count')
     def facet(data, **kwargs):
         data = data.pivot(index='y_bins', columns='x_bins', values='count')
         ax = sns.heatmap(data, **kwargs)
@@ -105,23 +140,56 @@ def plot_mixing(sim, dim):
     g.tight_layout()
 
 def plot_rships(sim):
-    layer_keys = list(sim['partners'].keys())
+    import seaborn as sns # Import here since slow
+    layer_keys = sim.people.layer_keys() # NB, sim['partners'] no longer exists as a parameter
     snaps = sim.get_analyzer('snapshot')
-
-    dfs = []
-    years = []
-    for year, people in snaps.snapshots.items():
-        df = pd.DataFrame({'age':people.age[people.alive==True], 'sex':people.is_female[people.alive==True]})
-        df['sex'].replace({True:'Female', False:'Male'}, inplace=True)
-        df['Age Bin'] = pd.cut(df['age'], people.age_bin_edges, right=False)
-        df['Year'] = year
-        for lk, lkey in enumerate(layer_keys):
-            df[lkey] = people.n_rships[lk, people.alive==True]
-        dfs.append(df)
-        years.append(year)
-    
-    df = pd.concat(dfs)
-    dfm = df.melt(id_vars=['Age Bin', 'sex', 'Year'], value_vars=layer_keys, var_name='Layer', value_name='n_rships')
+    snapshots = snaps.snapshots
+    years = list(snapshots.keys())
+    n_snaps = len(years)
+    n_layers = len(layer_keys)
+
+    edges = sim.people.age_bin_edges
+    nbins = len(edges) - 1
+    bin_labels = pd.IntervalIndex.from_breaks(edges, closed='left').astype(str)
+    widths = np.diff(edges)
+    uniform = np.all(widths[:-1] == widths[0]) # Uniform apart from (possibly) a wider final bin, as with the default 5-year bins ending at [85, 100)
+
+    # Flatten every snapshot into one pool of people tagged with a combined
+    # (snapshot, sex, age bin) id, so the mean number of relationships takes a
+    # single bincount per layer rather than a pass per snapshot, sex, and layer
+    ids = []
+    rships = []
+    last_people = None
+    for s, people in enumerate(snapshots.values()):
+        alive = people.alive == True
+        ages = people.age[alive]
+        if uniform:
+            # Straight arithmetic bin map, rather than digitize's binary search per element
+            age_bins = np.minimum((ages - edges[0])/widths[0], nbins-1).astype(np.int32)
+            valid = (ages >= edges[0]) & (ages < edges[-1]) # Mirror pd.cut, which drops out-of-range ages
+        else:
+            age_bins = np.digitize(ages, edges) - 1
+            valid = (age_bins >= 0) & (age_bins < nbins)
+        sex_ids = people.is_female[alive].astype(int)
+        ids.append(((s*2 + sex_ids)*nbins + age_bins)[valid])
+        rships.append(people.n_rships[:, alive][:, valid])
+        last_people = people
+    ids = np.concatenate(ids)
+    rships = np.concatenate(rships, axis=1)
+
+    n_ids = n_snaps*2*nbins
+    counts = np.maximum(np.bincount(ids, minlength=n_ids), 1)
+    means = np.empty((n_layers, n_ids))
+    for lk in range(n_layers):
+        means[lk] = np.bincount(ids, weights=rships[lk], minlength=n_ids)/counts
+
+    dfm = pd.DataFrame({
+        'Age Bin' : np.tile(bin_labels, n_layers*n_snaps*2),
+        'sex'     : np.tile(np.repeat(['Male', 'Female'], nbins), n_layers*n_snaps),
+        'Year'    : np.tile(np.repeat(years, 2*nbins), n_layers),
+        'Layer'   : np.repeat(layer_keys, n_snaps*2*nbins),
+        'n_rships': means.ravel(),
+    })
     g = sns.catplot(data=dfm, kind='bar', x='Age Bin', y='n_rships', hue='sex', col='Year', row='Layer', sharey=False, height=5, aspect=0.75, legend_out=False, palette='tab10')
     g.tick_params(axis='x', which='both', rotation=70)
     g.set_ylabels('Number of Relationships')
@@ -129,7 +197,13 @@ def plot_rships(sim):
     g.fig.subplots_adjust(top=0.9)
     g.fig.suptitle(sim.label)
 
-    dfm_fem = dfm[(dfm['sex'] == 'Female') & (dfm['Year'] == years[-1])]
+    # The box plot needs the raw distribution, but only for females in the final snapshot
+    people = last_people
+    alive_f = (people.alive == True) & (people.is_female == True)
+    df_fem = pd.DataFrame({'Age Bin': pd.cut(people.age[alive_f], people.age_bin_edges, right=False)})
+    for lk, lkey in enumerate(layer_keys):
+        df_fem[lkey] = people.n_rships[lk, alive_f]
+    dfm_fem = df_fem.melt(id_vars=['Age Bin'], value_vars=layer_keys, var_name='Layer', value_name='n_rships')
     h = sns.catplot(data=dfm_fem, kind='box', x='Age Bin', y='n_rships', col='Layer', sharey=False,
                     height=5, aspect=0.75, legend_out=False)
     h.tick_params(axis='x', which='both', rotation=70)
@@ -141,6 +215,8 @@ def plot_rships(sim):
 #%% Run as a script
 if __name__ == '__main__':
 
+    import matplotlib.pyplot as plt
+
     T = sc.tic()
     network_demo()
     sc.toc(T)
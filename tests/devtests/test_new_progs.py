@@ -3,11 +3,15 @@ Testing a new algorithm for computing progression probabilities
 """
 
 # Imports
+import sys
+from functools import lru_cache
 import numpy as np
 import sciris as sc
 import pandas as pd
 import hpvsim as hpv
-import hpvsim.utils as hpu
+import matplotlib
+if not sys.stdout.isatty():
+    matplotlib.use('Agg') # Headless run: skip GUI backend init, just rasterize for savefig
 import matplotlib.pyplot as plt
 from scipy.stats import lognorm
 
@@ -33,11 +37,13 @@ prog_rate_sd = [genotype_pars[genotype_map[g]]['prog_rate_sd'] for g in range(ng
 
 
 #%% Helper functions
+@lru_cache(maxsize=None)
 def lognorm_params(par1, par2):
     """
     Given the mean and std. dev. of the log-normal distribution, this function
     returns the shape and scale parameters for scipy's parameterization of the
-    distribution.
+    distribution. Cached, since the figure functions call this repeatedly with
+    the same genotype parameters.
     """
     mean = np.log(par1 ** 2 / np.sqrt(par2 ** 2 + par1 ** 2))  # Computes the mean of the underlying normal distribution
     sigma = np.sqrt(np.log(par2 ** 2 / par1 ** 2 + 1))  # Computes sigma for the underlying normal distribution
@@ -64,6 +70,11 @@ def logf2(x, x_infl, k):
     return l_asymp + 1/( 1 + np.exp(-k*(x-x_infl)))
 
 
+# Module-level generator for the sampling loops below: calling the Generator API
+# directly skips hpu.sample's per-call string dispatch, and a fixed seed makes the
+# figures reproducible
+rng = np.random.default_rng(12345)
+
 # Figure settings
 font_size = 30
 sc.fonts(add=sc.thisdir(aspath=True) / 'Libertinus Sans')
@@ -97,49 +108,49 @@ for g in range(ng):
     rv = lognorm(sigma, 0, scale)
     dd = logf1(longx, prog_rate[g])
 
-    indcin1 = sc.findinds(dd<.33)[-1]
-    if (dd>.33).any():
-        indcin2 = sc.findinds((dd>.33)&(dd<.67))[-1]
-    else:
-        indcin2 = indcin1
-    if (dd>.67).any():
-        indcin3 = sc.findinds((dd>.67)&(dd<cancer_thresh))[-1]
-    else:
-        indcin3 = indcin2
-    if (dd>cancer_thresh).any():
-        indcancer = sc.findinds(dd>cancer_thresh)[-1]
-    else:
-        indcancer = indcin3
+    # dd is monotonically increasing in longx, so the last index below each threshold
+    # can be found with a sorted search instead of three boolean reductions
+    indcin1 = np.searchsorted(dd, .33) - 1
+    indcin2 = np.searchsorted(dd, .67) - 1           if dd[-1] > .33           else indcin1
+    indcin3 = np.searchsorted(dd, cancer_thresh) - 1 if dd[-1] > .67           else indcin2
+    indcancer = len(dd) - 1                          if dd[-1] > cancer_thresh else indcin3
+
+    cdf = rv.cdf(longx) # Evaluate the CDF over the whole grid once and index into it below
 
     noneshares.append(1 - shares[g])
-    cin1shares.append(((rv.cdf(longx[indcin1])-rv.cdf(longx[0]))*shares[g]))
-    cin2shares.append(((rv.cdf(longx[indcin2])-rv.cdf(longx[indcin1]))*shares[g]))
-    cin3shares.append(((rv.cdf(longx[indcin3])-rv.cdf(longx[indcin2]))*shares[g]))
-    cancershares.append(((rv.cdf(longx[indcancer])-rv.cdf(longx[indcin3]))*shares[g]))
+    cin1shares.append((cdf[indcin1]-cdf[0])*shares[g])
+    cin2shares.append((cdf[indcin2]-cdf[indcin1])*shares[g])
+    cin3shares.append((cdf[indcin3]-cdf[indcin2])*shares[g])
+    cancershares.append((cdf[indcancer]-cdf[indcin3])*shares[g])
 
 ######## Outcomes by duration of infection and genotype
-n_samples = 10e3
+n_samples = int(10e3) # Cast once here, rather than making the sampling APIs coerce the float
 
 # create dataframes
-data = {}
 years = np.arange(1,13)
-cin1_shares, cin2_shares, cin3_shares, cancer_shares = [], [], [], []
-all_years = []
-all_genotypes = []
+n_rows = ng*len(years) # Known extent, so preallocate rather than growing lists
+cin1_shares, cin2_shares, cin3_shares, cancer_shares = (np.empty(n_rows) for _ in range(4))
+all_years = np.empty(n_rows, dtype=int)
+all_genotypes = np.empty(n_rows, dtype=object)
 for g in range(ng):
-    sigma, scale = lognorm_params(dur_dysp[g]['par1'], dur_dysp[g]['par2'])
-    r = lognorm(sigma, 0, scale)
-
-    for year in years:
-        mean_peaks = logf1(year, prog_rate[g])
-        peaks = logf1(year, hpu.sample(dist='normal', par1=prog_rate[g], par2=prog_rate_sd[g], size=n_samples))
-        cin1_shares.append(sum(peaks<0.33)/n_samples)
-        cin2_shares.append(sum((peaks>0.33)&(peaks<0.67))/n_samples)
-        cin3_shares.append(sum((peaks>0.67)&(peaks<cancer_thresh))/n_samples)
-        cancer_shares.append(sum(peaks>cancer_thresh)/n_samples)
-        all_years.append(year)
-        # all_genotypes.append(genotype_map[g].upper())
-        all_genotypes.append(genotype_map[g].replace('hpv',''))
+    # Draw the growth rates for all years in a single batched call, rather than one
+    # RNG invocation (plus a recomputed logf1) per year
+    ks = rng.normal(prog_rate[g], prog_rate_sd[g], size=(len(years), n_samples))
+    all_peaks = logf1(years[:, None], ks)
+
+    # Compute the shares for all years at once as vectorized boolean reductions --
+    # Python's sum() iterates the arrays element by element
+    over1 = all_peaks > 0.33
+    over2 = all_peaks > 0.67
+    over3 = all_peaks > cancer_thresh
+    rows = slice(g*len(years), (g+1)*len(years))
+    cin1_shares[rows]   = np.mean(~over1, axis=1)
+    cin2_shares[rows]   = np.mean(over1 & ~over2, axis=1)
+    cin3_shares[rows]   = np.mean(over2 & ~over3, axis=1)
+    cancer_shares[rows] = np.mean(over3, axis=1)
+    all_years[rows] = years
+    # all_genotypes[rows] = genotype_map[g].upper()
+    all_genotypes[rows] = genotype_map[g].replace('hpv','')
 data = {'Year':all_years, 'Genotype':all_genotypes, 'CIN1':cin1_shares, 'CIN2':cin2_shares, 'CIN3':cin3_shares, 'Cancer': cancer_shares}
 sharesdf = pd.DataFrame(data)
 
@@ -192,6 +203,7 @@ def make_precinfig():
 
     fig.tight_layout()
     plt.savefig("precin_dists.png", dpi=100)
+    plt.close(fig) # These are large figures (~30 MB each), so free them once saved
     print(table)
 
 
@@ -226,8 +238,8 @@ def make_cinfig():
     myg = 'hpv16'
     ax[2].plot(thisx, logf1(thisx, genotype_pars[myg]['prog_rate']), color='k', lw=2)
     for year in range(1, 21):# Plot variation
-        peaks = logf1(year, hpu.sample(dist='normal', par1=genotype_pars[myg]['prog_rate'],
-                                       par2=genotype_pars[myg]['prog_rate_sd'], size=n_samples))
+        peaks = logf1(year, rng.normal(genotype_pars[myg]['prog_rate'],
+                                       genotype_pars[myg]['prog_rate_sd'], size=n_samples))
         ax[2].plot([year]*n_samples, peaks, color='k', lw=0, marker='o', alpha=0.5)
 
     ax[2].set_xlabel("Duration of dysplasia prior to\nregression/cancer (years)")
@@ -250,6 +262,7 @@ def make_cinfig():
 
     fig.tight_layout()
     plt.savefig("cin_prog.png", dpi=100)
+    plt.close(fig)
 
 
 ################################################################################
@@ -305,6 +318,7 @@ def make_outcomefig():
 
     fig.tight_layout()
     plt.savefig("cin_outcomes.png", dpi=100)
+    plt.close(fig)
 
 
 
@@ -364,7 +378,7 @@ def make_fig1():
         ax[1,0].plot(thisx, logf1(thisx, prog_rate[g]), color=colors[g], lw=2, label=genotype_map[g].upper())
         # Plot variation
         for year in range(1, 21):
-            peaks = logf1(year, hpu.sample(dist='normal', par1=prog_rate[g], par2=prog_rate_sd[g], size=n_samples))
+            peaks = logf1(year, rng.normal(prog_rate[g], prog_rate_sd[g], size=n_samples))
             ax[1, 0].plot([year] * n_samples, peaks, color=colors[g], lw=0, marker='o', alpha=0.5)
 
     ax[1,0].set_xlabel("Duration of dysplasia")
@@ -423,6 +437,7 @@ def make_fig1():
 
     fig.tight_layout()
     plt.savefig("progressions-1.png", dpi=100)
+    plt.close(fig)
 
 
 
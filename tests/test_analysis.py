@@ -6,7 +6,6 @@ Tests for analyzers
 import sciris as sc
 import numpy as np
 import hpvsim as hpv
-import matplotlib.pyplot as plt
 
 do_plot = 1
 do_save = 0
@@ -202,6 +201,7 @@ def test_age_causal_analyzer(do_plot=True):
     cdf = np.cumsum(pdf)
 
     if do_plot:
+        import matplotlib.pyplot as plt # Import here since slow, and not needed in CI runs
         plt.figure()
         plt.plot(bins_count[1:], cdf)
         plt.title('Distribution of age of causal HPV infection')
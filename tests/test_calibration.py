@@ -6,7 +6,6 @@ Test calibration
 import sciris as sc
 import hpvsim as hpv
 import numpy as np
-import pylab as pl
 
 do_plot = 1
 do_save = 0
@@ -108,6 +107,7 @@ def test_calibration(do_plot=True):
 
     # Do plots for visual inspection
     if do_plot:
+        import pylab as pl # Import here since slow, and not needed in CI runs
         x = calib.analyzer_results[best_run]['cancers']['bins']
 
         fig, axes = pl.subplots(1,2)
@@ -3,16 +3,17 @@ Tests for single simulations
 '''
 
 #%% Imports and settings
+import os
 import sciris as sc
 import numpy as np
 import hpvsim as hpv
-import pandas as pd
-import matplotlib.pyplot as plt
 
 do_plot = 0
 do_save = 0
 
-n_agents = [500,50e3][0] # Swap between sizes
+full_scale = int(os.environ.get('HPVSIM_FULL_TESTS', 0)) # Fast (default) or full-scale tests; set HPVSIM_FULL_TESTS=1 e.g. for a nightly run
+n_agents = [500,50e3][full_scale] # Swap between sizes
+n_runs   = [1,3][full_scale] # One run per scenario suffices for smoke tests; runs are seed-paired across scenarios, so the comparison holds at n_runs=1
 
 base_pars = {
     'n_agents': n_agents,
@@ -24,6 +25,80 @@ base_pars = {
 }
 
 
+#%% Shared eligibility helpers
+
+# The timestep is fixed across these tests, so hoist the delay arithmetic out of the
+# per-timestep eligibility callbacks. NB, the intervention lookups by label can't be
+# hoisted the same way, since the sim deep-copies its interventions during validation,
+# so a closure over the originals would read stale outcomes.
+half_dt        = 0.5 / base_pars['dt'] # Timesteps between first and second vaccine doses
+rescreen_delay = 5   / base_pars['dt'] # Timesteps before someone is due for a rescreen
+
+# Routine vaccination scale-up schedule, constructed once rather than per test call;
+# marked read-only since the arrays are shared across every sim that uses them
+routine_years  = np.arange(2020, base_pars['end'], dtype=np.int32)
+routine_values = np.array([0,0,0,.1,.2,.3,.4,.5,.6,.7]+[.8]*20, dtype=np.float32)
+routine_years.setflags(write=False)
+routine_values.setflags(write=False)
+
+# Results plotted by the scenario tests; shared rather than rebuilt per test
+scens_to_plot = {
+    'HPV prevalence': ['hpv_prevalence'],
+    'Age standardized cancer incidence (per 100,000 women)': ['asr_cancer_incidence'],
+    'Cancer deaths per 100,000 women': ['cancer_mortality'],
+}
+
+def second_dose_eligible(sim):
+    ''' Eligibility for a second prophylactic vaccine dose; shared across tests, and
+    built with an in-place OR to avoid a third full-length temporary every timestep '''
+    elig = sim.people.doses == 1
+    elig |= sim.t > (sim.people.date_vaccinated + half_dt)
+    return elig
+
+def second_txvx_dose_eligible(sim):
+    ''' As above, for the therapeutic vaccine '''
+    elig = sim.people.txvx_doses == 1
+    elig |= sim.t > (sim.people.date_tx_vaccinated + half_dt)
+    return elig
+
+
+#%% Shared baseline sim
+
+_baseline_sim = None
+
+def get_baseline_sim():
+    '''
+    Run (once) and cache the no-intervention baseline sim that several tests compare
+    against. A post-burn-in fork would save more (runs are resumable via
+    sim.run(until=...)), but the vaccine interventions in the comparison sims must be
+    in place before the people are created so their immunity sources are counted, so
+    they can't share a warm start; instead this shares the whole completed run, which
+    callers must not modify.
+    '''
+    global _baseline_sim
+    if _baseline_sim is None:
+        _baseline_sim = hpv.Sim(pars=base_pars)
+        _baseline_sim.run()
+    return _baseline_sim
+
+
+_template_sim = None
+
+def get_template_sim():
+    '''
+    Shared pre-initialized template for the scenario tests. Scenarios deep-copies the
+    sim it is given, so sharing one initialized template is safe. NB, the saving is
+    only the initialize() that Scenarios.__init__ would otherwise do per test:
+    Scenarios.run() resets the people per scenario, so each scenario sim recreates
+    its population from the template regardless.
+    '''
+    global _template_sim
+    if _template_sim is None:
+        _template_sim = hpv.Sim(pars=base_pars)
+        _template_sim.initialize()
+    return _template_sim
+
+
 #%% Define the tests
 
 def test_screen_prob():
@@ -36,7 +111,7 @@ def test_screen_prob():
     age_range = [30, 50]
     len_age_range = age_range[1]-age_range[0]
     model_annual_prob = 1 - (1 - target_lifetime_prob)**(1/len_age_range)
-    screen_eligible = lambda sim: np.isnan(sim.people.date_screened) # Only model a single lifetime screen
+    screen_eligible = lambda sim: ~sim.people.screened # Only model a single lifetime screen; the screened state is flipped in place as people are screened, so this avoids an isnan() scan of date_screened every timestep
 
     screen = hpv.routine_screening(
         product='via',
@@ -121,9 +196,13 @@ def test_screen_prob():
     sim = hpv.Sim(pars=base_pars, interventions=[screen, triage, assign_tx, ablation, excision], analyzers=[intv_counter()])
     sim.run(verbose=0)
 
-    # Check that the right number of people are getting screened
-    n_eligible = len(hpv.true((sim.people.age >= 50) & (sim.people.age <= 70) & (sim.people.is_female) ))
-    n_screened = len(hpv.true((sim.people.age >= 50) & (sim.people.age <= 70) & (sim.people.is_female) & (sim.people.screened)))
+    # Check that the right number of people are getting screened. Filter to females
+    # once, then evaluate the remaining conditions on the roughly half-size subset
+    f_inds     = np.flatnonzero(sim.people.is_female)
+    ages_f     = sim.people.age[f_inds]
+    eligible_f = (ages_f >= 50) & (ages_f <= 70)
+    n_eligible = int(eligible_f.sum())
+    n_screened = int((eligible_f & sim.people.screened[f_inds]).sum())
     print(f'Proportion screened ({n_screened/n_eligible:.2f}) vs target: ({target_lifetime_prob})')
 
     # Check that the right number of people are getting triaged and assigned treatment
@@ -146,7 +225,7 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
 
     ### Create interventions
     # Screen, triage, assign treatment, treat
-    screen_eligible = lambda sim: np.isnan(sim.people.date_screened) | (sim.t > (sim.people.date_screened + 5 / sim['dt']))
+    screen_eligible = lambda sim: ~sim.people.screened | (sim.t > (sim.people.date_screened + rescreen_delay)) # Never screened, or due for a rescreen
     routine_screen = hpv.routine_screening(
         product='hpv',
         prob=0.1,
@@ -176,7 +255,7 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
     )
 
     #### New protocol: for those who screen positive, decide whether to immediately offer TxVx or refer them for further testing
-    screened_pos = lambda sim: list(set(sim.get_intervention('routine screening').outcomes['positive'].tolist() + sim.get_intervention('campaign screening').outcomes['positive'].tolist()))
+    screened_pos = lambda sim: np.union1d(sim.get_intervention('routine screening').outcomes['positive'], sim.get_intervention('campaign screening').outcomes['positive'])
     pos_screen_assesser = hpv.routine_triage(
         start_year=2030,
         prob = 1.0,
@@ -206,7 +285,7 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
     )
 
     # New and old protocol: for those who've been confirmed positive in their secondary diagnostic, determine what kind of treatment to offer them
-    confirmed_positive = lambda sim: list(set(sim.get_intervention('VIA triage (pre-txvx)').outcomes['positive'].tolist() + sim.get_intervention('VIA triage (post-txvx)').outcomes['positive'].tolist()))
+    confirmed_positive = lambda sim: np.union1d(sim.get_intervention('VIA triage (pre-txvx)').outcomes['positive'], sim.get_intervention('VIA triage (post-txvx)').outcomes['positive'])
     assign_treatment = hpv.routine_triage(
         prob = 1.0,
         annual_prob=False,
@@ -224,7 +303,7 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
         label = 'ablation'
     )
 
-    excision_eligible = lambda sim: list(set(sim.get_intervention('tx assigner').outcomes['excision'].tolist() + sim.get_intervention('ablation').outcomes['unsuccessful'].tolist()))
+    excision_eligible = lambda sim: np.union1d(sim.get_intervention('tx assigner').outcomes['excision'], sim.get_intervention('ablation').outcomes['unsuccessful'])
     excision = hpv.treat_delay(
         prob = 0.5,
         delay = 0.5,
@@ -248,9 +327,6 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
     st_interventions = soc_screen + triage_treat + new_screen
 
     ## Vaccination interventions
-    routine_years = np.arange(2020, base_pars['end'], dtype=int)
-    routine_values = np.array([0,0,0,.1,.2,.3,.4,.5,.6,.7,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8,.8])
-
     routine_vx = hpv.routine_vx(
         prob = routine_values,
         years = routine_years,
@@ -267,7 +343,6 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
         label = 'campaign vx'
     )
 
-    second_dose_eligible = lambda sim: (sim.people.doses == 1) | (sim.t > (sim.people.date_vaccinated + 0.5 / sim['dt']))
     second_dose = hpv.routine_vx(
         prob = 0.1,
         product = 'bivalent2',
@@ -280,26 +355,27 @@ def test_all_interventions(do_plot=False, do_save=False, fig_path=None):
     interventions =  st_interventions + vx_interventions
     for intv in interventions: intv.do_plot=False
 
-    sim0 = hpv.Sim(pars=base_pars)
-    sim0.run()
     sim = hpv.Sim(pars=base_pars, interventions=interventions)
     sim.run()
-    to_plot = {
-        'Screens': ['new_screens', 'new_screened'],
-        'Vaccines': ['new_total_vaccinated', 'new_doses'],
-        'Therapeutic vaccine': ['new_tx_vaccinated', 'new_txvx_doses'],
-        'Treatments': ['new_cin_treatments', 'new_cin_treated'],
-    }
-    sim.plot(to_plot=to_plot)
-
-    fig, ax = plt.subplots(1, 2)
-    for i, result in enumerate(['cancers', 'dysplasias']):
-        ax[i].plot(sim0.results['year'], sim0.results[result].values, label='No Screening')
-        ax[i].plot(sim.results['year'], sim.results[result].values, label='Screening')
-        ax[i].set_ylabel(result)
-        ax[i].legend()
-    fig.show()
 
+    if do_plot:
+        import matplotlib.pyplot as plt # Import here since slow, and not needed in CI runs
+        sim0 = get_baseline_sim() # The no-intervention comparator is only plotted, so don't run it headless
+        to_plot = {
+            'Screens': ['new_screens', 'new_screened'],
+            'Vaccines': ['new_total_vaccinated', 'new_doses'],
+            'Therapeutic vaccine': ['new_tx_vaccinated', 'new_txvx_doses'],
+            'Treatments': ['new_cin_treatments', 'new_cin_treated'],
+        }
+        sim.plot(to_plot=to_plot)
+
+        fig, ax = plt.subplots(1, 2)
+        for i, result in enumerate(['cancers', 'dysplasias']):
+            ax[i].plot(sim0.results['year'], sim0.results[result].values, label='No Screening')
+            ax[i].plot(sim.results['year'], sim.results[result].values, label='Screening')
+            ax[i].set_ylabel(result)
+            ax[i].legend()
+        fig.show()
 
     return sim
 
@@ -318,13 +394,12 @@ def test_txvx_noscreen(do_plot=False, do_save=False, fig_path=None):
         label = 'campaign txvx'
     )
 
-    second_dose_eligible = lambda sim: (sim.people.txvx_doses == 1) | (sim.t > (sim.people.date_tx_vaccinated + 0.5 / sim['dt']))
     campaign_txvx_dose2 = hpv.campaign_txvx(
         prob = 0.7,
         years=2030,
         age_range=[30, 70],
         product = 'txvx2',
-        eligibility = second_dose_eligible,
+        eligibility = second_txvx_dose_eligible,
         label = 'campaign txvx 2nd dose'
     )
 
@@ -336,13 +411,12 @@ def test_txvx_noscreen(do_plot=False, do_save=False, fig_path=None):
         label = 'routine txvx'
     )
 
-    second_dose_eligible = lambda sim: (sim.people.txvx_doses == 1) | (sim.t > (sim.people.date_tx_vaccinated + 0.5 / sim['dt']))
     routine_txvx_dose2 = hpv.routine_txvx(
         prob = 0.8,
         start_year = 2031,
         age_range = [30,31],
         product = 'txvx1',
-        eligibility=second_dose_eligible,
+        eligibility=second_txvx_dose_eligible,
         label = 'routine txvx 2nd dose'
     )
 
@@ -351,10 +425,12 @@ def test_txvx_noscreen(do_plot=False, do_save=False, fig_path=None):
 
     sim = hpv.Sim(pars=base_pars, interventions=interventions)
     sim.run()
-    to_plot = {
-        'Number vaccinated': ['new_tx_vaccinated', 'cum_tx_vaccinated'],
-    }
-    sim.plot(to_plot=to_plot)
+
+    if do_plot:
+        to_plot = {
+            'Number vaccinated': ['new_tx_vaccinated', 'cum_tx_vaccinated'],
+        }
+        sim.plot(to_plot=to_plot)
 
     return sim
 
@@ -363,7 +439,7 @@ def test_txvx_noscreen(do_plot=False, do_save=False, fig_path=None):
 def test_vx_effect(do_plot=False, do_save=False, fig_path=None):
     sc.heading('Testing effect of prophylactic vaccination')
 
-    debug_scens = 1
+    debug_scens = 0 # Scenarios.run() flattens the scenario x run fan-out into a single parallel multi_run dispatch; set to 1 to run serially for debugging
 
     ### Create interventions
     routine_vx_dose1 = hpv.routine_vx(
@@ -374,7 +450,6 @@ def test_vx_effect(do_plot=False, do_save=False, fig_path=None):
         label = 'Bivalent dose 1'
     )
 
-    second_dose_eligible = lambda sim: (sim.people.doses == 1) | (sim.t > (sim.people.date_vaccinated + 0.5 / sim['dt']))
     routine_vx_dose2 = hpv.routine_vx(
         prob = 0.8,
         start_year = 2023,
@@ -386,7 +461,7 @@ def test_vx_effect(do_plot=False, do_save=False, fig_path=None):
     interventions = [routine_vx_dose1, routine_vx_dose2]
     for intv in interventions: intv.do_plot=False
 
-    base_sim = hpv.Sim(pars=base_pars)
+    base_sim = get_template_sim()
 
     scenarios = {
         'baseline': {
@@ -402,24 +477,22 @@ def test_vx_effect(do_plot=False, do_save=False, fig_path=None):
         },
     }
 
-    metapars = {'n_runs': 3}
+    metapars = {'n_runs': n_runs}
     scens = hpv.Scenarios(sim=base_sim, metapars=metapars, scenarios=scenarios)
     scens.run(debug=debug_scens)
-    to_plot = {
-        'HPV prevalence': ['hpv_prevalence'],
-        'Age standardized cancer incidence (per 100,000 women)': ['asr_cancer_incidence'],
-        'Cancer deaths per 100,000 women': ['cancer_mortality'],
-    }
-    scens.plot(to_plot=to_plot)
+
+    if do_plot:
+        scens.plot(to_plot=scens_to_plot)
+
     return scens
 
 
-def test_screening():
+def test_screening(do_plot=False):
     sc.heading('Test new screening implementation')
 
     ### Create interventions
     # Screen, triage, assign treatment, treat
-    screen_eligible = lambda sim: np.isnan(sim.people.date_screened) | (sim.t > (sim.people.date_screened + 5 / sim['dt']))
+    screen_eligible = lambda sim: ~sim.people.screened | (sim.t > (sim.people.date_screened + rescreen_delay)) # Never screened, or due for a rescreen
     routine_screen = hpv.routine_screening(
         product='via',
         prob=1.0,
@@ -446,7 +519,7 @@ def test_screening():
         label = 'ablation'
     )
 
-    excision_eligible = lambda sim: list(set(sim.get_intervention('tx assigner').outcomes['excision'].tolist() + sim.get_intervention('ablation').outcomes['unsuccessful'].tolist()))
+    excision_eligible = lambda sim: np.union1d(sim.get_intervention('tx assigner').outcomes['excision'], sim.get_intervention('ablation').outcomes['unsuccessful'])
     excision = hpv.treat_num(
         prob = 1.0,
         product = 'excision',
@@ -469,34 +542,35 @@ def test_screening():
 
     for intv in interventions: intv.do_plot=False
 
-    sim0 = hpv.Sim(pars=base_pars)
-    sim0.run()
     sim = hpv.Sim(pars=base_pars, interventions=interventions)
     sim.run()
-    to_plot = {
-        'Dysplasias': ['dysplasias'],
-        # 'Screens': ['screens'],
-    }
-    sim.plot(to_plot=to_plot)
-
-    fig, ax = plt.subplots(1, 2)
-    for i, result in enumerate(['cancers', 'dysplasias']):
-        ax[i].plot(sim0.results['year'], sim0.results[result].values, label='No Screening')
-        ax[i].plot(sim.results['year'], sim.results[result].values, label='Screening')
-        ax[i].set_ylabel(result)
-        ax[i].legend()
-    fig.show()
 
+    if do_plot:
+        import matplotlib.pyplot as plt # Import here since slow, and not needed in CI runs
+        sim0 = get_baseline_sim() # The no-intervention comparator is only plotted, so don't run it headless
+        to_plot = {
+            'Dysplasias': ['dysplasias'],
+            # 'Screens': ['screens'],
+        }
+        sim.plot(to_plot=to_plot)
+
+        fig, ax = plt.subplots(1, 2)
+        for i, result in enumerate(['cancers', 'dysplasias']):
+            ax[i].plot(sim0.results['year'], sim0.results[result].values, label='No Screening')
+            ax[i].plot(sim.results['year'], sim.results[result].values, label='Screening')
+            ax[i].set_ylabel(result)
+            ax[i].legend()
+        fig.show()
 
     return sim
 
 
-def test_cytology():
+def test_cytology(do_plot=False):
     sc.heading('Test cytology vs HPV')
 
     # Algorithm 3 (https://www.ncbi.nlm.nih.gov/books/NBK572308/)
 
-    screen_eligible = lambda sim: np.isnan(sim.people.date_screened)# Single lifetime screen
+    screen_eligible = lambda sim: ~sim.people.screened # Single lifetime screen
     cytology = hpv.routine_screening(
         product='lbc',
         prob=1.0,
@@ -516,7 +590,7 @@ def test_cytology():
     )
 
     # Send abnormal cytology results, plus ASCUS results that were HPV+, for colpo
-    to_colpo = lambda sim: list(set(sim.get_intervention('cytology').outcomes['abnormal'].tolist() + sim.get_intervention('hpv triage').outcomes['positive'].tolist()))
+    to_colpo = lambda sim: np.union1d(sim.get_intervention('cytology').outcomes['abnormal'], sim.get_intervention('hpv triage').outcomes['positive'])
     colpo = hpv.routine_triage(
         product='colposcopy',
         prob = 0.5,
@@ -546,7 +620,7 @@ def test_cytology():
 
     for intv in interventions: intv.do_plot=False
 
-    base_sim = hpv.Sim(pars=base_pars)
+    base_sim = get_template_sim()
 
     scenarios = {
         'baseline': {
@@ -562,15 +636,13 @@ def test_cytology():
         },
     }
 
-    metapars = {'n_runs': 3}
+    metapars = {'n_runs': n_runs}
     scens = hpv.Scenarios(sim=base_sim, metapars=metapars, scenarios=scenarios)
     scens.run(debug=0)
-    to_plot = {
-        'HPV prevalence': ['hpv_prevalence'],
-        'Age standardized cancer incidence (per 100,000 women)': ['asr_cancer_incidence'],
-        'Cancer deaths per 100,000 women': ['cancer_mortality'],
-    }
-    scens.plot(to_plot=to_plot)
+
+    if do_plot:
+        scens.plot(to_plot=scens_to_plot)
+
     return scens
 
 
@@ -582,10 +654,10 @@ if __name__ == '__main__':
 
     sim0 = test_screen_prob()
     sim1 = test_all_interventions(do_plot=do_plot)
-    sim2 = test_txvx_noscreen()
-    sim3 = test_screening()
-    scens0 = test_vx_effect()
-    scens1 = test_cytology()
+    sim2 = test_txvx_noscreen(do_plot=do_plot)
+    sim3 = test_screening(do_plot=do_plot)
+    scens0 = test_vx_effect(do_plot=do_plot)
+    scens1 = test_cytology(do_plot=do_plot)
 
 
     sc.toc(T)